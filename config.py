@@ -13,4 +13,6 @@ for i in range(len(labels)):
 outlierValue=10000
 
 class_enc=True
-class_weighting=True
\ No newline at end of file
+class_weighting=True
+torch_compile=False
+autocast_inference=False
\ No newline at end of file
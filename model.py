@@ -3,6 +3,28 @@ import torch.nn as nn
 
 import config
 
+def seq_linear(linear, x):
+    r"""Applies ``linear`` along the sequence axis of ``x`` without permuting it to the last dimension.
+    Equivalent to ``linear(x.transpose(-1, -2)).transpose(-1, -2)``.
+    Shape:
+        - Input: :math:`(*, T, V)` with :math:`T == linear.in_features`
+        - Output: :math:`(*, T_{out}, V)` with :math:`T_{out} == linear.out_features`
+    """
+    return torch.matmul(linear.weight, x) + linear.bias.unsqueeze(-1)
+
+
+def compile_supported():
+    return (config.torch_compile and hasattr(nn.Module, 'compile')
+            and torch._dynamo.is_dynamo_supported())
+
+
+def activation_layer(activation='prelu'):
+    assert activation in ('prelu', 'relu')
+    if activation == 'relu':
+        return nn.ReLU(inplace=True)
+    return nn.PReLU()
+
+
 class ConvTemporalGraphical(nn.Module):
     # Source : https://github.com/yysijie/st-gcn/blob/master/net/st_gcn.py
     r"""The basic module for applying a graph convolution.
@@ -53,8 +75,12 @@ class ConvTemporalGraphical(nn.Module):
     def forward(self, x, A):
         assert A.size(0) == self.kernel_size
         x = self.conv(x)
-        x = torch.einsum('nctv,tvw->nctw', (x, A))
-        return x.contiguous(), A
+        # (N, C, T, V) x (T, V, W) -> (N, C, T, W) as a single batched GEMM over T
+        n, c, t, v = x.size()
+        x = x.permute(2, 0, 1, 3).reshape(t, n * c, v)
+        x = torch.bmm(x, A)
+        x = x.view(t, n, c, -1).permute(1, 2, 0, 3)
+        return x.contiguous(memory_format=torch.channels_last), A
 
 
 class st_gcn(nn.Module):
@@ -66,6 +92,7 @@ class st_gcn(nn.Module):
         stride (int, optional): Stride of the temporal convolution. Default: 1
         dropout (int, optional): Dropout rate of the final output. Default: 0
         residual (bool, optional): If ``True``, applies a residual mechanism. Default: ``True``
+        activation (str, optional): ``'prelu'`` or ``'relu'``, the non-linearity used in the block. Default: ``'prelu'``
     Shape:
         - Input[0]: Input graph sequence in :math:`(N, in_channels, T_{in}, V)` format
         - Input[1]: Input graph adjacency matrix in :math:`(K, V, V)` format
@@ -85,7 +112,8 @@ class st_gcn(nn.Module):
                  use_mdn=False,
                  stride=1,
                  dropout=0,
-                 residual=True):
+                 residual=True,
+                 activation='prelu'):
         super(st_gcn, self).__init__()
 
         #         print("outstg",out_channels)
@@ -100,7 +128,7 @@ class st_gcn(nn.Module):
 
         self.tcn = nn.Sequential(
             nn.BatchNorm2d(out_channels),
-            nn.PReLU(),
+            activation_layer(activation),
             nn.Conv2d(
                 out_channels,
                 out_channels,
@@ -111,6 +139,9 @@ class st_gcn(nn.Module):
             nn.BatchNorm2d(out_channels),
             nn.Dropout(dropout, inplace=True),
         )
+        if compile_supported():
+            # fuse the pointwise BN/PReLU/Dropout around the conv, V changes from scene to scene
+            self.tcn.compile(dynamic=True)
 
         if not residual:
             self.residual = lambda x: 0
@@ -128,7 +159,7 @@ class st_gcn(nn.Module):
                 nn.BatchNorm2d(out_channels),
             )
 
-        self.prelu = nn.PReLU()
+        self.prelu = activation_layer(activation)
 
     def forward(self, x, A):
 
@@ -143,9 +174,42 @@ class st_gcn(nn.Module):
         return x, A
 
 
+class txp_cnn(nn.Module):
+    r"""The residual chain of temporal extrapolator convolutions of :class:`social_stgcnn`.
+    Args:
+        seq_len (int): Length of the observed sequence
+        pred_seq_len (int): Length of the predicted sequence
+        n_txpcnn (int): Number of TXPCNN layers
+        activation (str, optional): ``'prelu'`` or ``'relu'``. Default: ``'prelu'``
+    Shape:
+        - Input: :math:`(N, T_{in}, C, V)`
+        - Output: :math:`(N, T_{out}, C, V)`
+    """
+
+    def __init__(self, seq_len, pred_seq_len, n_txpcnn, activation='prelu'):
+        super(txp_cnn, self).__init__()
+        self.tpcnns = nn.ModuleList()
+        self.tpcnns.append(nn.Conv2d(seq_len, pred_seq_len, 3, padding=1))
+        for j in range(1, n_txpcnn):
+            self.tpcnns.append(nn.Conv2d(pred_seq_len, pred_seq_len, 3, padding=1))
+        self.tpcnn_ouput = nn.Conv2d(pred_seq_len, pred_seq_len, 3, padding=1)
+
+        self.prelus = nn.ModuleList()
+        for j in range(n_txpcnn):
+            self.prelus.append(activation_layer(activation))
+
+    def forward(self, v):
+        v = self.prelus[0](self.tpcnns[0](v))
+
+        for k in range(1, len(self.tpcnns) - 1):
+            v = self.prelus[k](self.tpcnns[k](v)) + v
+
+        return self.tpcnn_ouput(v)
+
+
 class social_stgcnn(nn.Module):
     def __init__(self, n_stgcnn=1, n_txpcnn=1, input_feat=2, output_feat=5,
-                 seq_len=8, pred_seq_len=12, kernel_size=3, hot_enc_length=1):
+                 seq_len=8, pred_seq_len=12, kernel_size=3, hot_enc_length=1, activation='prelu'):
         super(social_stgcnn, self).__init__()
         if(config.class_enc):
             self.v_norm = nn.Sequential(
@@ -173,46 +237,51 @@ class social_stgcnn(nn.Module):
         self.n_txpcnn = n_txpcnn
 
         self.st_gcns = nn.ModuleList()
-        self.st_gcns.append(st_gcn(input_feat, output_feat, (kernel_size, seq_len)))
+        self.st_gcns.append(st_gcn(input_feat, output_feat, (kernel_size, seq_len), activation=activation))
         for j in range(1, self.n_stgcnn):
-            self.st_gcns.append(st_gcn(output_feat, output_feat, (kernel_size, seq_len)))
+            self.st_gcns.append(st_gcn(output_feat, output_feat, (kernel_size, seq_len), activation=activation))
 
-        self.tpcnns = nn.ModuleList()
-        self.tpcnns.append(nn.Conv2d(seq_len, pred_seq_len, 3, padding=1))
-        for j in range(1, self.n_txpcnn):
-            self.tpcnns.append(nn.Conv2d(pred_seq_len, pred_seq_len, 3, padding=1))
-        self.tpcnn_ouput = nn.Conv2d(pred_seq_len, pred_seq_len, 3, padding=1)
+        self.txpcnn = txp_cnn(seq_len, pred_seq_len, self.n_txpcnn, activation)
+        if compile_supported():
+            # one graph for the residual chain instead of a conv, activation and add launch per layer
+            self.txpcnn.compile(dynamic=True)
+        self._register_load_state_dict_pre_hook(self.load_legacy_txpcnn)
 
-        self.prelus = nn.ModuleList()
-        for j in range(self.n_txpcnn):
-            self.prelus.append(nn.PReLU())
+        # NHWC is the native conv layout for cuDNN/oneDNN, saves a reorder around every Conv2d
+        self.to(memory_format=torch.channels_last)
+
+    def load_legacy_txpcnn(self, state_dict, prefix, *args):
+        # checkpoints saved before txp_cnn keep its layers at the top level, e.g. tpcnns.0.weight
+        for key in list(state_dict):
+            name = key[len(prefix):]
+            if key.startswith(prefix) and name.split('.', 1)[0] in ('tpcnns', 'prelus', 'tpcnn_ouput'):
+                state_dict[prefix + 'txpcnn.' + name] = state_dict.pop(key)
 
     def forward(self, v, a, hot_enc): 
         # pedestrians that are within 1 pixel have same similarity as person they are next to
         # a = torch.where(a > 1, torch.ones_like(a), a)
         if(config.class_enc):
             #normalise inputs with layers
-            v = self.v_norm(v.permute(0, 1, 3, 2)).permute(0, 1, 3, 2)
-            a = self.a_norm(a.permute(1, 2, 0)).permute(2, 0, 1)
+            v = self.v_norm[1](seq_linear(self.v_norm[0], v))
+            # a is kept flattened as (T, V*V) so every linear below contracts the time axis in place
+            a_shape = a.shape
+            a = self.a_norm[1](seq_linear(self.a_norm[0], a.reshape(a_shape[0], -1)))
             #combine class labels with adjacency matrix
-            hot_enc = hot_enc.repeat(a.shape[1], 1, 1)
-            hot_enc = torch.cat((hot_enc.rot90(k=-1), hot_enc), 2)
+            hot_enc = hot_enc.view(a_shape[1], 1, -1)
+            pair_shape = (a_shape[1], a_shape[1], hot_enc.shape[-1])
+            # [i, j] = (class of i, class of j), both halves are broadcast views so cat does the only copy
+            hot_enc = torch.cat((hot_enc.expand(pair_shape), hot_enc.transpose(0, 1).expand(pair_shape)), 2)
 
             #linear
-            c = self.a_lin1(hot_enc).permute(2,0,1)# 8 31 31 #.squeeze().repeat(a.shape[0], 1, 1)
-            a = self.a_lin2(torch.cat((a, c)).permute(1, 2, 0)).permute(2, 0, 1) # 8 31 31
+            c = self.a_lin1[1](seq_linear(self.a_lin1[0], hot_enc.reshape(-1, hot_enc.shape[-1]).t())) # 8 961
+            a = self.a_lin2[1](seq_linear(self.a_lin2[0], torch.cat((a, c)))).view(a_shape) # 8 31 31
 
+        v = v.contiguous(memory_format=torch.channels_last)
         for k in range(self.n_stgcnn):
             v, a = self.st_gcns[k](v, a)
 
-        v = v.permute(0, 2, 1, 3)
-
-        v = self.prelus[0](self.tpcnns[0](v))
-
-        for k in range(1, self.n_txpcnn - 1):
-            v = self.prelus[k](self.tpcnns[k](v)) + v
-
-        v = self.tpcnn_ouput(v)
+        v = v.permute(0, 2, 1, 3).contiguous(memory_format=torch.channels_last)
+        v = self.txpcnn(v)
         v = v.permute(0, 2, 1, 3)
 
         return v, a
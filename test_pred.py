@@ -33,8 +33,9 @@ def test(KSTEPS=20):  # K=20
 
         # Forward
         V_obs_tmp = V_obs.permute(0, 3, 1, 2)
-        V_pred, _ = model(V_obs_tmp, A_obs.squeeze(), obs_classes)
-        V_pred = V_pred.permute(0, 2, 3, 1)
+        with torch.autocast(device_type='cuda', dtype=torch.float16, enabled=config.autocast_inference):
+            V_pred, _ = model(V_obs_tmp, A_obs.squeeze(), obs_classes)
+        V_pred = V_pred.float().permute(0, 2, 3, 1)  # bivariate params are sampled in fp32
 
         V_tr = V_tr.squeeze()
         A_tr = A_tr.squeeze()
@@ -177,7 +178,8 @@ def main():
         model = social_stgcnn(n_stgcnn=args.n_stgcnn, n_txpcnn=args.n_txpcnn,
 							  output_feat=args.output_size, seq_len=args.obs_seq_len,
 							  kernel_size=args.kernel_size, pred_seq_len=args.pred_seq_len,
-							  hot_enc_length=len(config.labels)).cuda()
+							  hot_enc_length=len(config.labels),
+							  activation=getattr(args, 'activation', 'prelu')).cuda()
         model.load_state_dict(torch.load(model_path))
         model.cuda()
 
@@ -197,6 +199,7 @@ def main():
 
         ade_ls.append(ade_)
         fde_ls.append(fde_)
+        print("Precision:", "fp16 autocast" if config.autocast_inference else "fp32")
         print("mADE:", ade_," mFDE:", fde_)
         print("aADE:", aade_, "aFDE:", afde_)
 
@@ -160,7 +160,8 @@ def start_training(datasetLocation, sampling_rate=15, num_epochs=250):
     model = social_stgcnn(n_stgcnn=args.n_stgcnn, n_txpcnn=args.n_txpcnn,   # 1,  5
                           output_feat=args.output_size, seq_len=args.obs_seq_len,     # 5,  8
                           kernel_size=args.kernel_size, pred_seq_len=args.pred_seq_len,   # 3,  12
-                          hot_enc_length=len(config.labels)).cuda()    # 6
+                          hot_enc_length=len(config.labels),    # 6
+                          activation=args.activation).cuda()
 
     # Training settings
     optimizer = optim.Adam(model.parameters(), lr=args.lr)
@@ -176,8 +177,7 @@ def start_training(datasetLocation, sampling_rate=15, num_epochs=250):
             else:
                 checkpoint_labels += ("-" + config.labels[i])
         checkpoint_dir = os.path.join(checkpoint_dir, checkpoint_labels)
-    if not os.path.exists(checkpoint_dir):
-        os.makedirs(checkpoint_dir)
+    os.makedirs(checkpoint_dir, exist_ok=True)
 
     with open(os.path.join(checkpoint_dir, 'args.pkl'), 'wb') as fp:
         pickle.dump(args, fp)
@@ -240,6 +240,8 @@ if __name__ == '__main__':
     parser.add_argument('--n_stgcnn', type=int, default=1, help='Number of ST-GCNN layers') 
     parser.add_argument('--n_txpcnn', type=int, default=5, help='Number of TXPCNN layers')
     parser.add_argument('--kernel_size', type=int, default=3)
+    parser.add_argument('--activation', type=str, default='prelu', choices=['prelu', 'relu'],
+                        help='Activation of the ST-GCNN and TXPCNN layers')
 
     # Data specifc paremeters
     parser.add_argument('--obs_seq_len', type=int, default=8)
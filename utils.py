@@ -160,10 +160,12 @@ class TrajectoryDataset(Dataset):
             if (np.array_equal(data, [])):
                 print(str(path) + " - No data in file")
                 continue
-            frames = np.unique(data[:, 0]).tolist()
-            frame_data = []
-            for frame in frames:
-                frame_data.append(data[frame == data[:, 0], :])  # the same scene put together e.g.[([2990,..biker],[2990,...],[2990...car]), ([2991,..biker],[2991,...])]
+            # the same scene put together e.g.[([2990,..biker],[2990,...],[2990...car]), ([2991,..biker],[2991,...])]
+            frame_ids = data[:, 0].astype(float)
+            order = np.argsort(frame_ids, kind='stable')
+            frames, frame_starts = np.unique(frame_ids[order], return_index=True)
+            frame_data = np.split(data[order], frame_starts[1:])
+            frames = frames.tolist()
             num_sequences = int(
                 math.ceil((len(frames) - self.seq_len + 1) / skip))  # step every skip frames
             for idx in range(0, num_sequences * self.skip + 1, skip): # every seq